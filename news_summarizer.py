@@ -5,15 +5,95 @@ Fetches articles from Feedbin, summarizes with ChatGPT, and emails results
 """
 
 import os
+import re
+import atexit
+import hashlib
 import requests
 import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email.message import EmailMessage
+from functools import lru_cache
+from html import unescape
+from pathlib import Path
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Optional
+from urllib.parse import urlencode, urlparse, parse_qs
+from urllib3.util.retry import Retry
 import json
 import time
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # Optional - falls back to the (slower) stdlib parser
+    _json_loads = json.loads
+
+try:
+    import tiktoken
+except ImportError:  # Optional - prompt token counts fall back to a rough estimate
+    tiktoken = None
+
+try:
+    import redis
+except ImportError:  # Optional - only needed for the semantic summary cache (REDIS_URL)
+    redis = None
+
+# Current OpenAI pricing (as of late 2024/early 2025) - (input, output) per 1K tokens
+_PRICING = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo': (0.0015, 0.002),
+    'gpt-4-turbo': (0.01, 0.03),
+    'gpt-4o-mini': (0.00015, 0.0006),
+}
+_DEFAULT_PRICE = _PRICING['gpt-4']
+
+# Context window sizes (prompt + completion tokens) for the supported models
+_CONTEXT_WINDOWS = {
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+    'gpt-4-turbo': 128000,
+    'gpt-4o-mini': 128000,
+}
+_DEFAULT_CONTEXT_WINDOW = 8192
+_MAX_COMPLETION_TOKENS = 1500
+
+# Precompiled patterns for clean_text
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _json(response: requests.Response):
+    """Decode a JSON response body, using orjson when it's installed"""
+    return _json_loads(response.content)
+
+def _pooled_session() -> requests.Session:
+    """Create a session with connection pooling and retries on transient errors"""
+    session = requests.Session()
+    # urllib3 doesn't retry POST by default, so ChatGPT calls are never sent twice.
+    # raise_on_status=False hands back the last response once retries run out, so
+    # callers' status_code checks still handle outages instead of a RetryError
+    retries = Retry(
+        total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retries)
+    session.mount('https://', adapter)
+    return session
+
+@dataclass(slots=True)
+class ArticleBatch:
+    """Formatted articles stored column-wise (one list per field)"""
+    titles: List[str] = field(default_factory=list)
+    urls: List[str] = field(default_factory=list)
+    summaries: List[str] = field(default_factory=list)
+    contents: List[str] = field(default_factory=list)
+    published: List[str] = field(default_factory=list)
+    feed_names: List[str] = field(default_factory=list)
+    
+    def __len__(self) -> int:
+        return len(self.titles)
+
 class NewsSymmarizer:
     def __init__(self):
         # API credentials - reading from environment variables for GitHub Actions
@@ -21,6 +101,10 @@ class NewsSymmarizer:
         self.feedbin_email = os.getenv('FEEDBIN_EMAIL', 'YOUR_FEEDBIN_EMAIL_HERE')
         self.feedbin_password = os.getenv('FEEDBIN_PASSWORD', 'YOUR_FEEDBIN_PASSWORD_HERE')
         self.openai_api_key = os.getenv('OPENAI_API_KEY', 'YOUR_OPENAI_API_KEY_HERE')
+        self.model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+        
+        # Verbose output plus extra diagnostic Feedbin requests (NEWS_DEBUG=1)
+        self.debug = os.getenv('NEWS_DEBUG', '0').strip().lower() in ('1', 'true', 'yes', 'on')
         
         # Email settings
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -28,154 +112,301 @@ class NewsSymmarizer:
         self.email_user = os.getenv('EMAIL_USER', 'YOUR_EMAIL_HERE')
         self.email_password = os.getenv('EMAIL_PASSWORD', 'YOUR_EMAIL_APP_PASSWORD_HERE')
         self.recipient_email = os.getenv('RECIPIENT_EMAIL', 'WHERE_TO_SEND_SUMMARY@example.com')
+        self._smtp: Optional[smtplib.SMTP] = None  # Opened on first send, reused after that
+        atexit.register(self._close_smtp)
         
         # API endpoints
         self.feedbin_base_url = 'https://api.feedbin.com/v2'
         self.openai_base_url = 'https://api.openai.com/v1'
         
+        # At most this many 100-entry pages per run - only the first 20 unique
+        # articles are summarized, so a week of full entries is wasted download
+        self.feedbin_max_pages = 3
+        
+        # Pooled sessions so repeat requests reuse TCP/TLS connections. Feedbin and
+        # OpenAI get separate sessions since they authenticate differently
+        self.session = _pooled_session()
+        self.session.auth = (self.feedbin_email, self.feedbin_password)
+        self.openai_session = _pooled_session()
+        self.openai_session.headers.update({
+            'Authorization': f'Bearer {self.openai_api_key}',
+            'Content-Type': 'application/json'
+        })
+        
         # Token usage tracking
         self.tokens_used_today = 0
         self.estimated_cost_today = 0.0
+        self._encoding = None  # tiktoken encoding for self.model, loaded on first use
+        self._encoding_failed = False  # Set if loading it failed, so we don't retry per article
+        
+        # One timestamp for the whole run, so every date we print or send agrees
+        self._run_now = datetime.now()
+        self._today_str = self._run_now.strftime('%Y-%m-%d')
+        self._month_start_str = self._run_now.replace(day=1).strftime('%Y-%m-%d')
+        self._run_date_str = self._run_now.strftime('%B %d, %Y')
+        self._run_human_str = self._run_now.strftime('%Y-%m-%d at %I:%M %p')
+        
+        # Summary cache - skips the ChatGPT call when the same articles were already summarized
+        self.summary_cache_enabled = os.getenv('SUMMARY_CACHE', '1') != '0'
+        self.summary_cache_dir = Path('.cache/summaries')
+        self.summary_cache_ttl = 24 * 60 * 60  # seconds
+        
+        # Optional Redis semantic cache - reuses a summary when a *similar* set of
+        # articles was summarized recently (requires redis + sentence-transformers)
+        self.redis = None
+        redis_url = os.getenv('REDIS_URL')
+        if redis_url:
+            if redis is None:
+                print("⚠️  REDIS_URL is set but the redis package isn't installed - semantic cache disabled")
+            else:
+                self.redis = redis.from_url(redis_url)
+        self.semantic_cache_index = 'summaries_idx'
+        self.semantic_cache_threshold = 0.95  # minimum cosine similarity for a hit
+        self._embedder = None
+        self._semantic_index_ready = False
+        
+        # feed_id -> title lookup, populated once per run from /subscriptions.json
+        self._feed_name_cache: Optional[Dict[int, str]] = None
+        
+        # ETag/Last-Modified validators (plus the last response) for conditional Feedbin requests
+        self._etag_store_path = Path('.cache/feedbin_etag.json')
+        self._etag_store = self._load_etag_store()
     
-    def fetch_recent_articles(self, hours_back: int = 24) -> List[Dict]:
+    def fetch_recent_articles(self, hours_back: int = 24) -> ArticleBatch:
         """Fetch articles from the last N hours from Feedbin"""
         
-        print(f"🔍 DEBUG: Fetching articles from last {hours_back} hours")
-        print(f"🔍 DEBUG: Using Feedbin email: {self.feedbin_email}")
+        self._debug(f"Fetching articles from last {hours_back} hours")
+        self._debug(f"Using Feedbin email: {self.feedbin_email}")
         
-        # Calculate timestamp for N hours ago
-        since_time = datetime.now() - timedelta(hours=hours_back)
+        # Calculate timestamp for N hours ago, floored to the hour so re-runs within
+        # the same hour send the same request and can get a 304 back
+        since_time = (self._run_now - timedelta(hours=hours_back)).replace(minute=0, second=0, microsecond=0)
         since_param = since_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-        print(f"🔍 DEBUG: Looking for articles since: {since_param}")
+        self._debug(f"Looking for articles since: {since_param}")
         
-        # First, let's check if we can connect to Feedbin at all
-        print("🔍 DEBUG: Testing Feedbin authentication...")
-        auth_test_url = f"{self.feedbin_base_url}/subscriptions.json"
-        auth_response = requests.get(auth_test_url, auth=(self.feedbin_email, self.feedbin_password))
+        entries_url = f"{self.feedbin_base_url}/entries.json"
+        
+        # These requests don't depend on each other, so fire them all at once:
+        # the subscriptions list (auth check + feed names), the actual
+        # date-filtered fetch and, in debug mode, a no-filter probe for ANY recent entries
+        self._debug("Testing Feedbin authentication and fetching entries...")
+        params = {'since': since_param, 'per_page': 100}  # Feedbin's max page size
+        
+        # Let Feedbin answer 304 Not Modified if the first page hasn't changed since the
+        # last identical request (the key includes 'since', so older cutoffs never match)
+        entries_cache_key = f"{entries_url}?{urlencode(params)}"
+        cached_entries = self._etag_store.get(entries_cache_key)
+        conditional_headers = {}
+        if cached_entries:
+            if cached_entries.get('etag'):
+                conditional_headers['If-None-Match'] = cached_entries['etag']
+            if cached_entries.get('last_modified'):
+                conditional_headers['If-Modified-Since'] = cached_entries['last_modified']
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            # The subscriptions list doubles as the feed name lookup, so load it once here
+            auth_future = executor.submit(self._load_feed_names)
+            filtered_future = executor.submit(
+                self.session.get, entries_url, params=params,
+                headers=conditional_headers
+            )
+            no_filter_future = None
+            if self.debug:
+                no_filter_future = executor.submit(
+                    self.session.get, entries_url,
+                    params={'per_page': 10}  # Just get 10 most recent
+                )
+            auth_response = auth_future.result()
+            response = filtered_future.result()
         
         if auth_response.status_code != 200:
             print(f"❌ ERROR: Feedbin authentication failed: {auth_response.status_code}")
             print(f"Response: {auth_response.text}")
-            return []
+            return ArticleBatch()
         else:
-            subscriptions = auth_response.json()
+            subscriptions = _json(auth_response)
             print(f"✅ SUCCESS: Connected to Feedbin. You have {len(subscriptions)} subscriptions")
-            if subscriptions:
+            if self.debug and subscriptions:
                 print("📰 Your feeds:")
                 for sub in subscriptions[:5]:  # Show first 5 feeds
                     print(f"  - {sub.get('title', 'Unknown')} ({sub.get('site_url', 'No URL')})")
                 if len(subscriptions) > 5:
                     print(f"  ... and {len(subscriptions) - 5} more feeds")
         
-        # Get entries from Feedbin - try without date filter first
-        print("🔍 DEBUG: Fetching recent entries...")
-        entries_url = f"{self.feedbin_base_url}/entries.json"
-        
-        # Try getting entries without date filter first to see if there are any
-        print("🔍 DEBUG: First, checking if there are ANY recent entries...")
-        no_filter_response = requests.get(
-            entries_url,
-            auth=(self.feedbin_email, self.feedbin_password),
-            params={'per_page': 10}  # Just get 10 most recent
-        )
-        
-        if no_filter_response.status_code == 200:
-            recent_entries = no_filter_response.json()
-            print(f"✅ Found {len(recent_entries)} recent entries (without date filter)")
-            if recent_entries:
-                latest_entry = recent_entries[0]
-                print(f"📅 Latest entry published: {latest_entry.get('published', 'No date')}")
-                print(f"📰 Latest entry title: {latest_entry.get('title', 'No title')}")
-        else:
-            print(f"❌ ERROR: Could not fetch entries: {no_filter_response.status_code}")
-            return []
-        
-        # Now try with date filter
-        params = {'since': since_param, 'per_page': 50}
-        print(f"🔍 DEBUG: Now trying with date filter: since={since_param}")
-        
-        response = requests.get(
-            entries_url,
-            auth=(self.feedbin_email, self.feedbin_password),
-            params=params
-        )
-        
-        if response.status_code != 200:
+        if no_filter_future is not None:
+            no_filter_response = no_filter_future.result()
+            if no_filter_response.status_code == 200:
+                recent_entries = _json(no_filter_response)
+                print(f"✅ Found {len(recent_entries)} recent entries (without date filter)")
+                if recent_entries:
+                    latest_entry = recent_entries[0]
+                    print(f"📅 Latest entry published: {latest_entry.get('published', 'No date')}")
+                    print(f"📰 Latest entry title: {latest_entry.get('title', 'No title')}")
+            else:
+                print(f"❌ ERROR: Could not fetch entries: {no_filter_response.status_code}")
+                return ArticleBatch()
+        
+        if response.status_code == 304 and cached_entries:
+            first_page = cached_entries.get('articles', [])
+            last_page = cached_entries.get('last_page', 1)
+            print("✅ First page of Feedbin entries unchanged (304 Not Modified), reusing cached copy")
+        elif response.status_code != 200:
             print(f"❌ ERROR: Failed to fetch filtered articles: {response.status_code}")
             print(f"Response: {response.text}")
-            return []
+            return ArticleBatch()
+        else:
+            first_page = _json(response)
+            last_page = self._last_page(response)
         
-        articles = response.json()
+        remaining_articles, all_pages_fetched = self._fetch_remaining_pages(entries_url, params, last_page)
+        articles = first_page + remaining_articles
         print(f"✅ Found {len(articles)} articles with date filter")
         
-        if not articles:
+        # Don't remember validators for a result we know is incomplete
+        if response.status_code == 200 and all_pages_fetched:
+            self._save_entries_validators(entries_cache_key, response, first_page, last_page)
+        
+        if not articles and self.debug:
             print("⚠️  No articles found with current date filter. Trying without date filter...")
             # If no articles with date filter, get some recent ones anyway for testing
-            fallback_response = requests.get(
+            fallback_response = self.session.get(
                 entries_url,
-                auth=(self.feedbin_email, self.feedbin_password),
                 params={'per_page': 20}
             )
             if fallback_response.status_code == 200:
-                articles = fallback_response.json()
+                articles = _json(fallback_response)
                 print(f"📰 Using {len(articles)} recent articles for testing (ignoring date filter)")
         
         # Filter and format articles
-        formatted_articles = []
+        batch = ArticleBatch()
         for article in articles:
-            formatted_articles.append({
-                'title': article.get('title', 'No Title'),
-                'url': article.get('url', ''),
-                'summary': article.get('summary', ''),
-                'content': article.get('content', ''),
-                'published': article.get('published', ''),
-                'feed_name': self.get_feed_name(article.get('feed_id'))
-            })
-        
-        print(f"🔍 DEBUG: Returning {len(formatted_articles)} formatted articles")
-        return formatted_articles
+            batch.titles.append(article.get('title', 'No Title'))
+            batch.urls.append(article.get('url', ''))
+            batch.summaries.append(article.get('summary', ''))
+            batch.contents.append(article.get('content', ''))
+            batch.published.append(article.get('published', ''))
+            batch.feed_names.append(self.get_feed_name(article.get('feed_id')))
+        
+        self._debug(f"Returning {len(batch)} formatted articles")
+        return batch
+    
+    def _debug(self, message: str):
+        """Print a diagnostic message when NEWS_DEBUG is enabled"""
+        if self.debug:
+            print(f"🔍 DEBUG: {message}")
+    
+    def _last_page(self, first_page: requests.Response) -> int:
+        """Read the last page number from a paginated response's Link header"""
+        last_link = first_page.links.get('last', {}).get('url')
+        if not last_link:
+            return 1
+        return int(parse_qs(urlparse(last_link).query).get('page', ['1'])[0])
+    
+    def _fetch_remaining_pages(self, entries_url: str, params: Dict, last_page: int):
+        """Fetch pages 2..last of a paginated entries request in parallel
+        
+        Returns the articles and whether every page was fetched successfully.
+        """
+        if last_page > self.feedbin_max_pages:
+            print(f"⚠️  {last_page} pages of entries available, only fetching the newest {self.feedbin_max_pages}")
+            last_page = self.feedbin_max_pages
+        if last_page < 2:
+            return [], True
+        
+        self._debug(f"Fetching {last_page - 1} more page(s) of entries...")
+        
+        def fetch_page(page: int) -> Optional[List[Dict]]:
+            response = self.session.get(
+                entries_url,
+                params={**params, 'page': page}
+            )
+            if response.status_code != 200:
+                return None
+            return _json(response)
+        
+        articles = []
+        failed_pages = []
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pages = range(2, last_page + 1)
+            for page, page_articles in zip(pages, executor.map(fetch_page, pages)):
+                if page_articles is None:
+                    failed_pages.append(page)
+                else:
+                    articles.extend(page_articles)
+        
+        if failed_pages:
+            print(f"⚠️  Could not fetch entries page(s) {', '.join(map(str, failed_pages))} - "
+                  f"continuing with {len(articles)} articles from the other pages")
+        
+        return articles, not failed_pages
+    
+    def _load_etag_store(self) -> Dict:
+        """Load saved ETag/Last-Modified validators from disk"""
+        try:
+            with open(self._etag_store_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_entries_validators(self, key: str, response: requests.Response,
+                                 articles: List[Dict], last_page: int):
+        """Remember the first page's validators and body so the next run can send a conditional request"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        
+        # Only the current request is worth keeping - older 'since' values never match again
+        self._etag_store = {
+            key: {
+                'etag': etag,
+                'last_modified': last_modified,
+                'last_page': last_page,
+                'articles': articles
+            }
+        }
+        try:
+            self._etag_store_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._etag_store_path, 'w', encoding='utf-8') as f:
+                json.dump(self._etag_store, f)
+        except OSError as e:
+            print(f"⚠️  Could not write Feedbin ETag cache: {e}")
+    
+    def _load_feed_names(self) -> requests.Response:
+        """Fetch subscriptions once and cache feed names by feed ID"""
+        response = self.session.get(f"{self.feedbin_base_url}/subscriptions.json")
+        
+        if response.status_code == 200:
+            self._feed_name_cache = {
+                feed.get('feed_id'): feed.get('title', 'Unknown Feed')
+                for feed in _json(response)
+            }
+        else:
+            # Don't retry on every article if the lookup failed
+            self._feed_name_cache = {}
+        
+        return response
     
     def get_feed_name(self, feed_id: int) -> str:
         """Get feed name from feed ID"""
         if not feed_id:
             return "Unknown Feed"
-            
-        feed_url = f"{self.feedbin_base_url}/subscriptions.json"
-        response = requests.get(
-            feed_url,
-            auth=(self.feedbin_email, self.feedbin_password)
-        )
         
-        if response.status_code == 200:
-            feeds = response.json()
-            for feed in feeds:
-                if feed.get('feed_id') == feed_id:
-                    return feed.get('title', 'Unknown Feed')
+        if self._feed_name_cache is None:
+            self._load_feed_names()
         
-        return "Unknown Feed"
+        return self._feed_name_cache.get(feed_id, "Unknown Feed")
     
-    def clean_text(self, text: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def clean_text(text: str) -> str:
         """Clean HTML and excessive whitespace from text"""
-        import re
-        from html import unescape
-        
-        # Remove HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
-        # Decode HTML entities
-        text = unescape(text)
-        # Clean up whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        return text
+        # Remove HTML tags, decode HTML entities, then clean up whitespace
+        return _WHITESPACE_RE.sub(' ', unescape(_HTML_TAG_RE.sub('', text))).strip()
     
     def get_api_usage_info(self) -> Dict:
         """Get current API usage and billing information from OpenAI"""
         
-        headers = {
-            'Authorization': f'Bearer {self.openai_api_key}',
-            'Content-Type': 'application/json'
-        }
-        
         # Get usage information (this endpoint shows usage data)
         usage_info = {
             'current_usage': None,
@@ -186,19 +417,16 @@ class NewsSymmarizer:
         try:
             # Get usage data for current billing period
             # Note: OpenAI's usage endpoint format may change
-            today = datetime.now().strftime('%Y-%m-%d')
-            start_of_month = datetime.now().replace(day=1).strftime('%Y-%m-%d')
-            
             usage_url = f"{self.openai_base_url}/usage"
             params = {
-                'start_date': start_of_month,
-                'end_date': today
+                'start_date': self._month_start_str,
+                'end_date': self._today_str
             }
             
-            response = requests.get(usage_url, headers=headers, params=params)
+            response = self.openai_session.get(usage_url, params=params)
             
             if response.status_code == 200:
-                usage_data = response.json()
+                usage_data = _json(response)
                 usage_info['current_usage'] = usage_data
             else:
                 usage_info['error'] = f"Usage API error: {response.status_code}"
@@ -211,23 +439,111 @@ class NewsSymmarizer:
     def estimate_token_cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
         """Estimate cost based on token usage"""
         
-        # Current OpenAI pricing (as of late 2024/early 2025)
-        pricing = {
-            'gpt-4': {'input': 0.03, 'output': 0.06},  # per 1K tokens
-            'gpt-3.5-turbo': {'input': 0.0015, 'output': 0.002},  # per 1K tokens
-            'gpt-4-turbo': {'input': 0.01, 'output': 0.03},
-        }
+        # Default to GPT-4 pricing if unknown model
+        input_price, output_price = _PRICING.get(model, _DEFAULT_PRICE)
+        
+        return (input_tokens / 1000) * input_price + (output_tokens / 1000) * output_price
+    
+    def _read_cached_summary(self, key: str) -> Optional[str]:
+        """Return a cached summary for this key if it exists and hasn't expired"""
+        if not self.summary_cache_enabled:
+            return None
+        
+        cache_path = self.summary_cache_dir / f"{key}.txt"
+        try:
+            if time.time() - cache_path.stat().st_mtime > self.summary_cache_ttl:
+                return None
+            summary = cache_path.read_text(encoding='utf-8')
+            return summary if summary.strip() else None
+        except OSError:
+            return None
+    
+    def _write_cached_summary(self, key: str, summary: str):
+        """Store a summary on disk so identical re-runs can skip the API call"""
+        if not self.summary_cache_enabled:
+            return
+        
+        cache_path = self.summary_cache_dir / f"{key}.txt"
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(summary, encoding='utf-8')
+        except OSError as e:
+            print(f"⚠️  Could not write summary cache: {e}")
+    
+    def _embed_articles(self, article_texts: List[str]):
+        """Embed the article set for the semantic cache, or None if unavailable"""
+        if not article_texts:
+            return None
+        
+        try:
+            if self._embedder is None:
+                from sentence_transformers import SentenceTransformer
+                self._embedder = SentenceTransformer('all-MiniLM-L6-v2')  # 384-dim vectors
+            
+            # MiniLM truncates at 256 word pieces, so embed each article separately and
+            # average them - otherwise only the first article or two would count
+            embeddings = self._embedder.encode(article_texts, normalize_embeddings=True)
+        except ImportError:
+            print("⚠️  sentence-transformers isn't installed - semantic cache disabled")
+            self.redis = None
+            return None
+        except Exception as e:
+            print(f"⚠️  Could not embed articles ({e}) - semantic cache disabled")
+            self.redis = None
+            return None
         
-        if model not in pricing:
-            # Default to GPT-4 pricing if unknown model
-            model = 'gpt-4'
+        pooled = embeddings.mean(axis=0)
+        return (pooled / max(float((pooled ** 2).sum()) ** 0.5, 1e-12)).astype('float32')
+    
+    def _ensure_semantic_index(self, dim: int):
+        """Create the vector index on first use"""
+        if self._semantic_index_ready:
+            return
+        
+        try:
+            self.redis.execute_command(
+                'FT.CREATE', self.semantic_cache_index, 'ON', 'JSON', 'PREFIX', '1', 'sum:',
+                'SCHEMA', '$.vec', 'AS', 'vec', 'VECTOR', 'FLAT', '6',
+                'TYPE', 'FLOAT32', 'DIM', str(dim), 'DISTANCE_METRIC', 'COSINE'
+            )
+        except redis.ResponseError as e:
+            if 'already exists' not in str(e).lower():
+                raise
+        self._semantic_index_ready = True
+    
+    def _read_semantic_cache(self, embedding) -> Optional[str]:
+        """Return the stored summary of the most similar article set, if similar enough"""
+        try:
+            self._ensure_semantic_index(len(embedding))
             
-        input_cost = (input_tokens / 1000) * pricing[model]['input']
-        output_cost = (output_tokens / 1000) * pricing[model]['output']
+            result = self.redis.execute_command(
+                'FT.SEARCH', self.semantic_cache_index, '*=>[KNN 1 @vec $vec AS score]',
+                'PARAMS', '2', 'vec', embedding.tobytes(),
+                'SORTBY', 'score', 'RETURN', '2', 'score', '$.summary', 'DIALECT', '2'
+            )
+        except redis.RedisError as e:
+            print(f"⚠️  Semantic cache lookup failed: {e}")
+            return None
+        
+        if not result or result[0] == 0:
+            return None
         
-        return input_cost + output_cost
+        fields = dict(zip(result[2][::2], result[2][1::2]))
+        # COSINE scores are distances, so similarity = 1 - score
+        if 1 - float(fields[b'score']) < self.semantic_cache_threshold:
+            return None
+        
+        return fields[b'$.summary'].decode('utf-8')
+    
+    def _write_semantic_cache(self, key: str, embedding, summary: str):
+        """Store a summary with its embedding so similar article sets can reuse it"""
+        try:
+            self.redis.json().set(f"sum:{key}", '$', {'vec': embedding.tolist(), 'summary': summary})
+            self.redis.expire(f"sum:{key}", self.summary_cache_ttl)
+        except redis.RedisError as e:
+            print(f"⚠️  Could not write semantic cache: {e}")
     
-    def display_usage_summary(self):
+    def display_usage_summary(self, usage_info: Optional[Dict] = None):
         """Display current API usage and cost information"""
         
         print("\n" + "="*50)
@@ -240,8 +556,9 @@ class NewsSymmarizer:
             print(f"  Tokens used: {self.tokens_used_today:,}")
             print(f"  Estimated cost: ${self.estimated_cost_today:.4f}")
         
-        # Try to get overall account usage
-        usage_info = self.get_api_usage_info()
+        # Try to get overall account usage (unless it was already fetched in the background)
+        if usage_info is None:
+            usage_info = self.get_api_usage_info()
         
         if usage_info['error']:
             print(f"\n⚠️  Could not fetch account usage: {usage_info['error']}")
@@ -255,41 +572,41 @@ class NewsSymmarizer:
         
         # Display helpful context
         print(f"\n💡 Cost Context:")
+        print(f"  GPT-4o-mini: ~$0.0004 per 1K tokens")
         print(f"  GPT-3.5-turbo: ~$0.002 per 1K tokens")
         print(f"  GPT-4: ~$0.045 per 1K tokens")
         print(f"  Average daily run: 2K-5K tokens")
         
         # Show recommendations
         if self.estimated_cost_today > 0.10:  # More than 10 cents
-            print(f"\n💰 Cost Tip: Consider switching to GPT-3.5-turbo to reduce costs")
+            print(f"\n💰 Cost Tip: Set OPENAI_MODEL=gpt-4o-mini to reduce costs")
         
         print("="*50 + "\n")
     
-    def summarize_with_chatgpt(self, articles: List[Dict]) -> str:
-        """Send articles to ChatGPT for summarization"""
-        
-        if not articles:
-            return "No new articles found in the specified time period."
-        
-        # Prepare articles text for ChatGPT
-        articles_text = ""
-        for i, article in enumerate(articles[:20], 1):  # Limit to 20 articles to avoid token limits
-            clean_summary = self.clean_text(article['summary'] or article['content'])
-            # Truncate very long articles
-            if len(clean_summary) > 500:
-                clean_summary = clean_summary[:500] + "..."
-                
-            articles_text += f"""
-Article {i}:
-Title: {article['title']}
-Source: {article['feed_name']}
-Summary: {clean_summary}
-URL: {article['url']}
-
-"""
-        
-        # ChatGPT prompt
-        prompt = f"""Please create a concise daily news summary from the following articles. 
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens locally (roughly 4 characters per token without tiktoken)"""
+        if tiktoken is None or self._encoding_failed:
+            return len(text) // 4 + 1
+        
+        if self._encoding is None:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    # Newer model than this tiktoken version knows about
+                    self._encoding = tiktoken.get_encoding('o200k_base')
+            except Exception as e:
+                # tiktoken downloads its BPE files on first use - a network hiccup
+                # here shouldn't stop the summary, it's only a pre-flight estimate
+                print(f"⚠️  Could not load tiktoken encoding ({e}) - estimating token counts")
+                self._encoding_failed = True
+                return len(text) // 4 + 1
+        
+        return len(self._encoding.encode(text))
+    
+    def _build_prompt(self, articles_text: str) -> str:
+        """Wrap the formatted articles in the summarization instructions"""
+        return f"""Please create a concise daily news summary from the following articles. 
 
 Format the summary as follows:
 1. Start with a brief overview paragraph
@@ -304,36 +621,120 @@ Here are today's articles:
 {articles_text}
 
 Please focus on the most important and interesting stories, and make the summary engaging and easy to read."""
-
-        # Make API request to ChatGPT
-        headers = {
-            'Authorization': f'Bearer {self.openai_api_key}',
-            'Content-Type': 'application/json'
-        }
+    
+    def summarize_with_chatgpt(self, articles: ArticleBatch) -> str:
+        """Send articles to ChatGPT for summarization"""
+        
+        if not articles:
+            return "No new articles found in the specified time period."
+        
+        # Drop syndicated duplicates so they don't use up the 20-article budget
+        seen_urls = set()
+        unique_indexes = []
+        for i, url in enumerate(articles.urls):
+            if url and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            unique_indexes.append(i)
+        
+        # Prepare articles text for ChatGPT, adding articles only while they fit in
+        # the model's context window (minus room for the completion)
+        context_window = _CONTEXT_WINDOWS.get(self.model, _DEFAULT_CONTEXT_WINDOW)
+        budget = context_window - _MAX_COMPLETION_TOKENS - self._count_tokens(self._build_prompt(''))
+        article_parts = []
+        for n, i in enumerate(unique_indexes[:20], 1):  # Limit to 20 articles to avoid token limits
+            # Only 500 cleaned chars survive, so don't run the regexes over the whole article
+            raw_text = articles.summaries[i] or articles.contents[i] or ''
+            if len(raw_text) > 2000:
+                raw_text = raw_text[:2000]
+                # Don't leave half a tag behind for clean_text to miss
+                if raw_text.rfind('<') > raw_text.rfind('>'):
+                    raw_text = raw_text[:raw_text.rfind('<')]
+            clean_summary = self.clean_text(raw_text)
+            # Truncate very long articles
+            if len(clean_summary) > 500:
+                clean_summary = clean_summary[:500] + "..."
+                
+            article_text = (
+                f"\nArticle {n}:\n"
+                f"Title: {articles.titles[i]}\n"
+                f"Source: {articles.feed_names[i]}\n"
+                f"Summary: {clean_summary}\n"
+                f"URL: {articles.urls[i]}\n\n"
+            )
+            article_tokens = self._count_tokens(article_text)
+            if article_tokens > budget:
+                print(f"⚠️  Token budget reached, summarizing {n - 1} of {len(unique_indexes)} articles")
+                break
+            budget -= article_tokens
+            article_parts.append(article_text)
+        articles_text = "".join(article_parts)
+        
+        prompt = self._build_prompt(articles_text)
+        prompt_tokens = self._count_tokens(prompt)
+        print(f"🔤 Prompt size: ~{prompt_tokens:,} tokens")
         
+        # Make API request to ChatGPT
         data = {
-            'model': 'gpt-4',  # or 'gpt-3.5-turbo' for lower cost
+            'model': self.model,
             'messages': [
                 {'role': 'user', 'content': prompt}
             ],
-            'max_tokens': 1500,
-            'temperature': 0.7
+            'max_tokens': min(_MAX_COMPLETION_TOKENS, context_window - prompt_tokens),
+            'temperature': 0.7,
+            'stream': True,
+            # Streamed responses only report token usage when asked to
+            'stream_options': {'include_usage': True}
         }
         
-        response = requests.post(
+        # Same model + same articles = same prompt, so reuse a recent summary if we have one
+        cache_key = hashlib.md5((data['model'] + articles_text).encode('utf-8')).hexdigest()
+        cached_summary = self._read_cached_summary(cache_key)
+        if cached_summary is not None:
+            print("♻️  Using cached summary (articles unchanged since last run)")
+            return cached_summary
+        
+        # Fall back to a semantic match: overlapping stories from an earlier run
+        embedding = self._embed_articles(article_parts) if self.redis is not None else None
+        if embedding is not None:
+            similar_summary = self._read_semantic_cache(embedding)
+            if similar_summary is not None:
+                print("♻️  Using cached summary of a similar set of articles")
+                return similar_summary
+        
+        response = self.openai_session.post(
             f"{self.openai_base_url}/chat/completions",
-            headers=headers,
-            json=data
+            json=data,
+            stream=True
         )
         
-        if response.status_code != 200:
-            print(f"Error with ChatGPT API: {response.status_code}")
-            return f"Error generating summary. Found {len(articles)} articles."
-        
-        result = response.json()
+        # Close the streamed response on every path so its connection returns to the pool
+        with response:
+            if response.status_code != 200:
+                print(f"Error with ChatGPT API: {response.status_code}")
+                return f"Error generating summary. Found {len(articles)} articles."
+            
+            # Read the server-sent event stream, collecting content deltas as they arrive
+            content_parts = []
+            usage = {}
+            for raw_line in response.iter_lines():
+                line = raw_line.decode('utf-8')
+                if not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    break
+                chunk = _json_loads(payload)
+                if chunk.get('error'):
+                    print(f"Error with ChatGPT API stream: {chunk['error'].get('message', chunk['error'])}")
+                    break
+                for choice in chunk.get('choices', []):
+                    content_parts.append(choice.get('delta', {}).get('content') or '')
+                # The final chunk (with no choices) carries the usage totals
+                if chunk.get('usage'):
+                    usage = chunk['usage']
         
         # Track token usage and cost
-        usage = result.get('usage', {})
         input_tokens = usage.get('prompt_tokens', 0)
         output_tokens = usage.get('completion_tokens', 0)
         total_tokens = usage.get('total_tokens', 0)
@@ -347,16 +748,25 @@ Please focus on the most important and interesting stories, and make the summary
         print(f"🔤 Tokens used: {total_tokens:,} (input: {input_tokens:,}, output: {output_tokens:,})")
         print(f"💰 Estimated cost: ${session_cost:.4f}")
         
-        return result['choices'][0]['message']['content']
+        summary = ''.join(content_parts)
+        if not summary.strip():
+            # Error chunk or cut-off stream - don't cache a blank summary for 24h
+            print("Error with ChatGPT API: the response stream contained no summary")
+            return f"Error generating summary. Found {len(articles)} articles."
+        
+        self._write_cached_summary(cache_key, summary)
+        if embedding is not None:
+            self._write_semantic_cache(cache_key, embedding, summary)
+        
+        return summary
     
     def send_email(self, summary: str, article_count: int):
         """Send the summary via email"""
         
         # Create email
-        msg = MIMEMultipart()
+        msg = EmailMessage()
         msg['From'] = self.email_user
-        msg['To'] = self.recipient_email
-        msg['Subject'] = f"Daily News Summary - {datetime.now().strftime('%B %d, %Y')} ({article_count} articles)"
+        msg['Subject'] = f"Daily News Summary - {self._run_date_str} ({article_count} articles)"
         
         # Email body
         body = f"""
@@ -368,45 +778,116 @@ Here's your daily news summary based on {article_count} articles from your Feedb
 
 ---
 This summary was automatically generated from your Feedbin feeds.
-Generated on {datetime.now().strftime('%Y-%m-%d at %I:%M %p')}
+Generated on {self._run_human_str}
         """
         
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_user, self.email_password)
-            server.send_message(msg)
-            server.quit()
+        # Single text/plain part with no multipart wrapper; non-ASCII text is sent as
+        # 8bit or quoted-printable (whichever fits) instead of always base64
+        msg.set_content(body)
+        
+        # Send email - one connection for every recipient (RECIPIENT_EMAIL may be comma-separated)
+        recipients = [r.strip() for r in self.recipient_email.split(',') if r.strip()]
+        failed = []
+        for recipient in recipients:
+            del msg['To']
+            msg['To'] = recipient
+            try:
+                self._deliver(msg)
+            except Exception as e:
+                print(f"Error sending email to {recipient}: {e}")
+                failed.append(recipient)
+        
+        if not failed:
             print("Summary email sent successfully!")
-        except Exception as e:
-            print(f"Error sending email: {e}")
+        elif len(failed) < len(recipients):
+            print(f"Summary email sent to {len(recipients) - len(failed)} of {len(recipients)} recipients "
+                  f"(failed: {', '.join(failed)})")
+    
+    def _open_smtp(self) -> smtplib.SMTP:
+        """Open an authenticated SMTP connection, or return the one already open"""
+        if self._smtp is None:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            try:
+                server.starttls()
+                server.login(self.email_user, self.email_password)
+            except Exception:
+                # Don't leak the socket when STARTTLS or the login fails
+                server.close()
+                raise
+            self._smtp = server
+        return self._smtp
+    
+    def _close_smtp(self):
+        """Close the SMTP connection if one is open"""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass  # Server already dropped the connection
+        self._smtp = None
+    
+    def _drop_smtp_if_stale(self):
+        """Close the shared SMTP connection if it no longer answers NOOP, so the next send reconnects"""
+        if self._smtp is None:
+            return
+        try:
+            code, _ = self._smtp.noop()
+        except (smtplib.SMTPException, OSError):
+            code = None
+        if code != 250:
+            self._close_smtp()
+    
+    def _deliver(self, msg):
+        """Send a message over the shared SMTP connection, reconnecting once if it went stale"""
+        try:
+            self._open_smtp().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+            # Idle sessions usually get "421 4.4.2 Timeout" (raised as e.g.
+            # SMTPSenderRefused) rather than a plain disconnect
+            if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+                raise
+            self._close_smtp()
+            self._open_smtp().send_message(msg)
     
     def run_daily_summary(self, hours_back: int = 24):
         """Main function to run the daily summary"""
-        print(f"Fetching articles from the last {hours_back} hours...")
-        
-        # Fetch articles
-        articles = self.fetch_recent_articles(hours_back)
-        print(f"Found {len(articles)} articles")
-        
-        if not articles:
-            print("No articles found. Sending notification email.")
-            self.send_email("No new articles found in your feeds today.", 0, [])
-            return
-        
-        # Generate summary
-        print("Generating summary with ChatGPT...")
-        summary = self.summarize_with_chatgpt(articles)
-        
-        # Send email
-        print("Sending summary email...")
-        self.send_email(summary, len(articles))
-        
-        # Display usage summary
-        self.display_usage_summary()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            print(f"Fetching articles from the last {hours_back} hours...")
+            
+            # Fetch articles
+            articles = self.fetch_recent_articles(hours_back)
+            print(f"Found {len(articles)} articles")
+            
+            if not articles:
+                print("No articles found. Sending notification email.")
+                self.send_email("No new articles found in your feeds today.", 0)
+                return
+            
+            # Account usage doesn't depend on the summary, so fetch it in the
+            # background while ChatGPT/SMTP do their thing
+            usage_future = executor.submit(self.get_api_usage_info)
+            
+            # Log in to SMTP while ChatGPT is generating, so the connection is ready to send
+            smtp_future = executor.submit(self._open_smtp)
+            
+            # Generate summary
+            print("Generating summary with ChatGPT...")
+            summary = self.summarize_with_chatgpt(articles)
+            
+            # Send email
+            print("Sending summary email...")
+            smtp_error = smtp_future.exception()
+            if smtp_error is not None:
+                # send_email will try to connect again and report the error
+                print(f"⚠️  Early SMTP login failed: {smtp_error}")
+            else:
+                # A long generation can outlast the server's idle timeout
+                self._drop_smtp_if_stale()
+            self.send_email(summary, len(articles))
+            
+            # Display usage summary
+            self.display_usage_summary(usage_future.result())
         
         print("Daily summary complete!")
 